@@ -1,15 +1,15 @@
 import asyncio
 import logging
-from binascii import hexlify
+import sys
+from binascii import hexlify, unhexlify
 from hashlib import sha256
-from io import BytesIO
+from io import BytesIO, StringIO
 
 try:
     from os import dupterm
 except ImportError:
-    # unix mpy doesn't have dupterm; define a no-op version
-    def dupterm(stream_object, index=0):
-        return stream_object
+    # unix mpy doesn't have dupterm; RunPyJob redirects stdout instead
+    dupterm = None
 
 
 from micropython import const
@@ -22,15 +22,16 @@ class Job:
 
     argc = 0
 
-    def __init__(self, cmd, args=[], client_id="localhost", **kwargs):
-        if not self.argc:
-            self.argc = len(args)
-        if len(args) != self.argc:
+    def __init__(self, cmd, args=(), client_id="localhost", **kwargs):
+        # argc of 0 means the job accepts any number of arguments
+        if self.argc and len(args) != self.argc:
             raise ValueError(
                 f"Wrong number of arguments for {cmd}; expected {self.argc}"
             )
 
-        self.globals = kwargs.get("globals", {})
+        self.globals = kwargs.get("globals")
+        if self.globals is None:  # don't share a default between jobs
+            self.globals = {}
         self.cmd = cmd
         self.args = args
         self.client_id = client_id
@@ -54,24 +55,37 @@ class Job:
         return True
 
     @classmethod
-    def from_cmd(cls, cmd_str, client_id=None, globals={}):
+    def from_cmd(cls, cmd_str, client_id=None, globals=None):
         """Create a job from a command string, e.g. 'cat file1.txt'."""
-        # Split command string into command and following arguments
-        try:
-            cmd, remainder = cmd_str.split(" ", 1)
-        except ValueError:
+        # Split command string into command and following arguments; find the
+        # first space rather than unpacking a split, which would raise (and
+        # allocate an exception) for every command without arguments
+        i = cmd_str.find(" ")
+        if i < 0:
             cmd, remainder = cmd_str, None
+        else:
+            cmd, remainder = cmd_str[:i], cmd_str[i + 1 :]
 
         # Lookup command in command table
-        if cmd not in COMMANDS:
+        job_cls = COMMANDS.get(cmd)
+        if job_cls is None:
             raise ValueError(f"Unknown command: '{cmd}'")
-        job_cls = COMMANDS[cmd]
 
-        # For eval, preserve the remainder as a single string argument and de-quote it
+        # For eval, preserve the remainder as a single string argument and remove
+        # surrounding quotes if they enclose all of it, e.g. not in "'a' + 'b'"
         # Otherwise, split remainder into separate arguments
         if remainder:
             if cmd == "eval":
-                args = [remainder.strip("\"'")]
+                remainder = remainder.strip()
+                quote = remainder[:1]
+                if (
+                    quote in ("'", '"')
+                    and len(remainder) > 1
+                    and remainder[-1] == quote
+                    and quote not in remainder[1:-1]
+                ):
+                    remainder = remainder[1:-1]
+                args = [remainder]
             else:
                 args = remainder.split(" ")
         else:
@@ -99,19 +113,16 @@ class SequentialJob(Job):
 
     # Validate that the message arrived in sequence for this job
     def _check_seq(self, seq):
-        if seq == -1:  # end of sequence
+        # Check the common cases first: end of sequence, or the next message
+        next_seq = self.seq + 1
+        if seq == -1 or seq == next_seq:
             return seq
+
         if seq < -1:
             raise ValueError(f"Invalid message sequence: {seq}")
-
-        next_seq = self.seq + 1
-
         if seq < next_seq:
             raise RuntimeError(f"Duplicate message: expected seq {next_seq}, got {seq}")
-        if seq > next_seq:
-            raise ValueError(f"Message missing: expected seq {next_seq}, got {seq}")
-
-        return seq
+        raise ValueError(f"Message missing: expected seq {next_seq}, got {seq}")
 
 
 class GetFileJob(Job):
@@ -133,14 +144,57 @@ class WhoAmIJob(Job):
 class PlatformInfoJob(Job):
     """Returns information about the device platform."""
 
-    def output(self):
-        import sys
+    # Platform info can't change while running, so build it once on import
+    INFO = "MQTerm v{} on {} v{}".format(
+        VERSION,
+        sys.implementation.name,
+        ".".join(map(str, sys.implementation.version[:3])),
+    ).encode("utf-8")
 
-        impl = sys.implementation.name
-        py_version = ".".join(map(str, sys.implementation.version[:3]))
-        return BytesIO(
-            "MQTerm v{} on {} v{}".format(VERSION, impl, py_version).encode("utf-8")
-        )
+    def output(self):
+        return BytesIO(self.INFO)
+
+
+class LinesReader:
+    """Readable stream of lines, encoded only as they are read."""
+
+    def __init__(self, lines):
+        self.lines = lines
+        self.index = 0
+        self.pending = b""  # rest of a line that didn't fit in the last read
+
+    def readinto(self, buf):
+        """Read as many lines as fit into a buffer and return the size."""
+        view = memoryview(buf)
+        size = 0
+        while size < len(buf):
+            if not self.pending:
+                if self.index == len(self.lines):
+                    break
+                line = self.lines[self.index]
+                self.pending = (("\n" + line) if self.index else line).encode("utf-8")
+                self.index += 1
+            count = min(len(self.pending), len(buf) - size)
+            view[size : size + count] = self.pending[:count]
+            self.pending = self.pending[count:]
+            size += count
+        return size
+
+    def read(self):
+        """Read all remaining lines."""
+        data = bytearray()
+        chunk = bytearray(256)
+        while True:
+            size = self.readinto(chunk)
+            if not size:
+                return bytes(data)
+            data += chunk[:size]
+
+    def close(self):
+        """Release the remaining lines."""
+        self.lines = []
+        self.index = 0
+        self.pending = b""
 
 
 class ListDirJob(Job):
@@ -149,9 +203,12 @@ class ListDirJob(Job):
     argc = 1
 
     def output(self):
+        """Stream the sorted names in the directory, one per line."""
         import os
 
-        return BytesIO("\n".join(sorted(os.listdir(self.args[0]))).encode("utf-8"))
+        names = os.listdir(self.args[0])
+        names.sort()  # in place, rather than copying into a new list
+        return LinesReader(names)
 
 
 class PutFileJob(SequentialJob):
@@ -159,18 +216,43 @@ class PutFileJob(SequentialJob):
 
     argc = 1
 
+    BLOCK_SIZE = const(4096)  # Write to the file in chunks of this size
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.file = open(self.args[0], "wb")
+        self.buffer = bytearray(self.BLOCK_SIZE)
+        self.buf_view = memoryview(self.buffer)
+        self.buf_len = 0
         self.bytes_written = 0
 
     async def update(self, payload, seq):
         """Write the payload to the file and close if finished."""
         await super().update(payload, seq)
         if self.ready:
+            self._flush()
             self.file.close()
         else:
+            self._write_payload(payload)
+
+    def _write_payload(self, payload):
+        """Buffer a payload, writing to the file once a block has accumulated."""
+        payload_len = len(payload)
+        if self.buf_len + payload_len > self.BLOCK_SIZE:
+            self._flush()
+
+        # Payloads too big to buffer go straight to the file
+        if payload_len >= self.BLOCK_SIZE:
             self.bytes_written += self.file.write(payload)
+        else:
+            self.buf_view[self.buf_len : self.buf_len + payload_len] = payload
+            self.buf_len += payload_len
+
+    def _flush(self):
+        """Write any buffered data to the file."""
+        if self.buf_len > 0:
+            self.bytes_written += self.file.write(self.buf_view[: self.buf_len])
+            self.buf_len = 0
 
     def output(self):
         """Return the number of bytes written to the file."""
@@ -192,8 +274,10 @@ class FirmwareUpdateJob(SequentialJob):
 
         super().__init__(*args, **kwargs)
         self.checksum = self.args[0]
+        self.expected_digest = self._parse_checksum(self.checksum)
         self.sha = sha256()
         self.buffer = bytearray(self.BLOCK_SIZE)
+        self.buf_view = memoryview(self.buffer)
         self.buf_len = 0
         self.bytes_written = 0
         self.current_block = 0
@@ -207,10 +291,6 @@ class FirmwareUpdateJob(SequentialJob):
     async def update(self, payload, seq):
         """Write the payload to the firmware file and close if finished."""
         await super().update(payload, seq)
-        if payload:
-            self.sha.update(payload)
-            payload_len = len(payload)
-
         if self.ready:
             # If there is any data left in the buffer, write it to flash memory
             if self.buf_len > 0:
@@ -223,49 +303,69 @@ class FirmwareUpdateJob(SequentialJob):
                 f"Firmware update complete, wrote {self.bytes_written} bytes"
             )
         else:
-            # If this message would overflow the buffer, we're ready to write a block
-            if self.buf_len + payload_len >= self.BLOCK_SIZE:
-                self._write_block(payload, payload_len)
+            self._write_payload(payload)
+
+    def _write_payload(self, payload):
+        """Copy a payload into the buffer, writing each block as it fills up."""
+        # Payloads may span several blocks, so senders are free to batch many
+        # chunks into a single message. Slicing the memoryview avoids copying.
+        view = memoryview(payload)
+        payload_len = len(payload)
+        offset = 0
+        while offset < payload_len:
+            # Whole blocks can go straight from the payload to flash memory
+            if self.buf_len == 0 and payload_len - offset >= self.BLOCK_SIZE:
+                block = view[offset : offset + self.BLOCK_SIZE]
+                self.sha.update(block)
+                self.partition.writeblocks(self.current_block, block)
+                self.current_block += 1
+                offset += self.BLOCK_SIZE
+                continue
+
+            size = min(payload_len - offset, self.BLOCK_SIZE - self.buf_len)
+            self.buf_view[self.buf_len : self.buf_len + size] = view[
+                offset : offset + size
+            ]
+            self.buf_len += size
+            offset += size
+            if self.buf_len == self.BLOCK_SIZE:
+                self._write_block()
+        self.bytes_written += payload_len
 
-            # Otherwise, just add the payload to the buffer
-            else:
-                self.buffer[self.buf_len : self.buf_len + payload_len] = payload
-                self.buf_len += payload_len
-            self.bytes_written += payload_len
-
-    def _write_block(self, payload=None, payload_len=None):
-        """Assemble a block and write to flash memory."""
-        # See how much space is left in the block
-        block_remaining = self.BLOCK_SIZE - self.buf_len
-
-        # If there is space remaining in the block and we got passed a payload,
-        # use as much of it as we can to fill the block. If no payload, fill up
-        # the rest of the block with empty data instead.
-        if block_remaining > 0:
-            if payload:
-                self.buffer[self.buf_len : self.BLOCK_SIZE] = payload[:block_remaining]
-                payload_len -= block_remaining
-                self.bytes_written += payload_len
-            else:
-                for i in range(self.buf_len, self.BLOCK_SIZE):
-                    self.buffer[i] = 0xFF  # Erased flash memory is 0xFF
-        self.buf_len = self.BLOCK_SIZE  # Buffer is now full
+    def _write_block(self):
+        """Write the buffer to flash memory as the next block."""
+        # Hash the data in the block as a whole, excluding any padding
+        self.sha.update(self.buf_view[: self.buf_len])
+
+        # If the block isn't full (i.e. it's the last one), fill up the rest
+        # of the block with empty data. This happens once per update, so the
+        # padding is built on demand rather than kept around on the heap.
+        if self.buf_len < self.BLOCK_SIZE:
+            pad_len = self.BLOCK_SIZE - self.buf_len
+            self.buf_view[self.buf_len :] = b"\xff" * pad_len  # Erased flash is 0xFF
 
         # Write the current block to flash memory and reset buffer
         self.partition.writeblocks(self.current_block, self.buffer)
         self.current_block += 1
         self.buf_len = 0
 
-        # If there is still data left from the payload, add it to the buffer
-        # for the next block and reset the buffer length
-        if payload_len and payload_len > 0:
-            self.buffer[:payload_len] = payload[block_remaining:]
-            self.buf_len = payload_len
+    @staticmethod
+    def _parse_checksum(checksum):
+        """Decode a hex SHA256 checksum, rejecting it before flashing if invalid."""
+        try:
+            digest = unhexlify(checksum)
+        except ValueError:
+            digest = b""
+        if len(digest) != 32:
+            raise ValueError(f"Invalid SHA256 checksum: {checksum}")
+        return digest
 
     def _validate_firmware(self):
         """Validate the firmware file before finalizing the update."""
-        hex_digest = hexlify(self.sha.digest()).decode("utf-8")
-        if not hex_digest == self.checksum:
+        digest = self.sha.digest()
+        if digest != self.expected_digest:
+            # Only hex-encode the digest when reporting a mismatch
+            hex_digest = hexlify(digest).decode("utf-8")
             raise ValueError(
                 f"Checksum mismatch: expected {self.checksum}, got {hex_digest}"
             )
@@ -306,39 +406,80 @@ class RebootJob(Job):
         return BytesIO(msg.encode("utf-8"))
 
 
+# Compiled scripts as (mode, code) by source, shared by all RunPyJobs
+_code_cache = {}
+
+
 class RunPyJob(Job):
     """A job to evaluate Python script on the device."""
 
     argc = 1
 
+    CACHE_SIZE = const(16)  # Number of compiled scripts to keep around
+    CACHE_MAX_LEN = const(256)  # Longest script to keep in the cache
+
     def output(self):
         """Eval or exec given Python and return the result."""
-        expr = self.args[0]
-        try:
-            result = self.do_eval(expr)
-        except SyntaxError:  # Not an expression, try exec
-            result = self.do_exec(expr)
+        mode, op = self._compile(self.args[0])
+        if mode == "eval":
+            result = self.do_eval(op)
+        else:
+            result = self.do_exec(op)
         if isinstance(result, str):  # Ensure bytes output
             result = result.encode("utf-8")
         return BytesIO(result)
 
-    def do_eval(self, expr):
-        """Evaluate a Python expression and return the result."""
-        op = compile(expr, "<string>", "eval")
+    def do_eval(self, op):
+        """Evaluate a compiled Python expression and return the result."""
         result = eval(op, self.globals, None)
         return repr(result)
 
-    def do_exec(self, expr):
-        """Execute a Python statement and return the output."""
-        out_buf = BytesIO()
-        old_term = dupterm(out_buf)
+    def do_exec(self, op):
+        """Execute compiled Python statements and return the output."""
+        out_buf, stop_capture = self._capture_output()
         try:
-            op = compile(expr, "<string>", "exec")
             exec(op, self.globals, None)
-            result = out_buf.getvalue().strip()
         finally:
-            dupterm(old_term)
-        return result
+            stop_capture()
+        return out_buf.getvalue().strip()
+
+    def _compile(self, expr):
+        """Compile Python for eval if it's an expression, otherwise for exec."""
+        # Scripts are often sent repeatedly (e.g. polling a value), and parsing
+        # and compiling is the slowest part of running them on the device
+        compiled = _code_cache.get(expr)
+        if compiled is not None:
+            return compiled
+
+        try:
+            compiled = ("eval", compile(expr, "<string>", "eval"))
+        except SyntaxError:  # Not an expression, try exec
+            compiled = ("exec", compile(expr, "<string>", "exec"))
+
+        # Only keep short scripts, so large ones don't stay on the heap
+        if len(expr) <= self.CACHE_MAX_LEN:
+            if len(_code_cache) >= self.CACHE_SIZE:  # evict any entry
+                del _code_cache[next(iter(_code_cache))]
+            _code_cache[expr] = compiled
+        return compiled
+
+    @staticmethod
+    def _capture_output():
+        """Start capturing printed output; returns the buffer and a stop function."""
+        if dupterm is not None:
+            out_buf = BytesIO()
+            old_term = dupterm(out_buf)
+            return out_buf, lambda: dupterm(old_term)
+
+        # Without dupterm, redirect stdout instead if the platform allows it
+        out_buf = StringIO()
+        try:
+            from contextlib import redirect_stdout
+        except ImportError:  # no way to capture output on this platform
+            return out_buf, lambda: None
+        redirect = redirect_stdout(out_buf)
+        redirect.__enter__()
+        return out_buf, lambda: redirect.__exit__(None, None, None)
 
 
 # Map commands to associated job names
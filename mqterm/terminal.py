@@ -1,3 +1,4 @@
+import asyncio
 import logging
 
 from amqc.properties import CORRELATION_DATA, USER_PROPERTY
@@ -28,8 +29,8 @@ def parse_client_id(properties):
 
 def parse_seq(properties):
     """Extract the sequence number from MQTT User Properties."""
-    user_properties = properties.get(USER_PROPERTY, {})
-    seq = user_properties.get("seq", None)
+    user_properties = properties.get(USER_PROPERTY)  # no default dict per call
+    seq = user_properties.get("seq") if user_properties else None
     if not seq:
         raise ValueError("Missing sequence information")
     try:
@@ -42,6 +43,7 @@ def parse_seq(properties):
 class MqttTerminal:
     PKTLEN = 1400  # data bytes that reasonably fit into a TCP packet
     BUFLEN = PKTLEN * 2  # payload size for MQTT messages
+    WINDOW = 4  # number of output messages allowed in flight at once
 
     def __init__(
         self,
@@ -55,8 +57,8 @@ class MqttTerminal:
         self.in_topic = format_topic(self.topic_prefix, "tty", "in")
         self.out_topic = format_topic(self.topic_prefix, "tty", "out")
         self.err_topic = format_topic(self.topic_prefix, "tty", "err")
-        self.out_buffer = bytearray(self.BUFLEN)
-        self.out_view = memoryview(self.out_buffer)
+        self.out_buffers = [bytearray(self.BUFLEN) for _ in range(self.WINDOW)]
+        self.out_views = [memoryview(buf) for buf in self.out_buffers]
         self.logger = logger
         self.jobs = {}
         self.globals = globals
@@ -72,7 +74,7 @@ class MqttTerminal:
     async def handle_msg(self, topic, msg, properties={}):
         """Process a single MQTT message and apply to the appropriate job."""
         if not topic.startswith(self.in_topic):
-            self.logger.debug(f"Terminal received message on {topic}; ignoring")
+            self.logger.debug("Terminal received message on %s; ignoring", topic)
             return
 
         client_id = parse_client_id(properties)
@@ -95,21 +97,20 @@ class MqttTerminal:
                 qos=1,
                 properties=format_properties(client_id, -1),
             )
-            if client_id in self.jobs:  # remove job on fatal error
-                del self.jobs[client_id]
+            self.jobs.pop(client_id, None)  # remove job on fatal error
 
     async def update_job(self, client_id, seq, payload):
         """Update or create a job, running it if ready."""
         # Fetch existing job or create a new one
-        if client_id in self.jobs:
-            job = self.jobs[client_id]
+        job = self.jobs.get(client_id)
+        if job is not None:
             await job.update(payload, seq)
-            self.logger.debug(f"Updated {job}, seq: {seq}")
+            self.logger.debug("Updated %s, seq: %d", job, seq)
         else:
             cmd = payload.decode("utf-8")
             job = Job.from_cmd(cmd, client_id=client_id, globals=self.globals)
             self.jobs[client_id] = job
-            self.logger.info(f"Created {job}")
+            self.logger.info("Created %s", job)
 
         # Run the job if it's ready and stream the results / signal completion
         if job.ready:
@@ -120,22 +121,55 @@ class MqttTerminal:
                 qos=1,
                 properties=format_properties(client_id, -1),
             )
-            self.logger.info(f"Completed {job}")
-            del self.jobs[client_id]
+            self.logger.info("Completed %s", job)
+            self.jobs.pop(client_id, None)
 
     async def stream_job_output(self, job):
         """Stream the output of a job to the output topic."""
         in_buffer = job.output()
-        seq = 0
-        while True:
-            bytes_read = in_buffer.readinto(self.out_buffer)
-            if bytes_read > 0:
-                await self.mqtt_client.publish(
-                    self.out_topic,
-                    self.out_view[:bytes_read],
-                    qos=1,
-                    properties=format_properties(job.client_id, seq),
-                )
-                seq += 1
-            else:
-                break
+        try:
+            pending = []  # publishes in flight, oldest first
+            props = []  # properties for each in-flight message
+            seq = 0
+            while True:
+                # Each in-flight message owns a buffer; wait for the oldest one to
+                # be acknowledged before reading the next chunk into its buffer
+                slot = seq % self.WINDOW
+                if len(pending) == self.WINDOW:
+                    await pending.pop(0)
+
+                bytes_read = in_buffer.readinto(self.out_buffers[slot])
+                if bytes_read > 0:
+                    # Like its buffer, a slot's properties are free for reuse once
+                    # its message is acknowledged; only the sequence number changes
+                    if seq < self.WINDOW:
+                        props.append(format_properties(job.client_id, seq))
+                    else:
+                        props[slot][USER_PROPERTY]["seq"] = str(seq)
+                    pending.append(
+                        asyncio.create_task(
+                            self.mqtt_client.publish(
+                                self.out_topic,
+                                self.out_views[slot][:bytes_read],
+                                qos=1,
+                                properties=props[slot],
+                            )
+                        )
+                    )
+                    seq += 1
+                else:
+                    break
+
+            # Wait for the rest of the output to be acknowledged
+            while pending:
+                await pending.pop(0)
+        finally:
+            # If a publish failed, cancel the others so none of them can send
+            # from a shared buffer after we return and it is reused
+            if pending:
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+
+            # Close the stream (e.g. a file) even if publishing failed
+            in_buffer.close()
@@ -7,6 +7,7 @@ from binascii import hexlify
 from hashlib import sha256
 from unittest import TestCase
 
+from mqterm import jobs
 from mqterm.jobs import (
     FirmwareUpdateJob,
     GetFileJob,
@@ -15,6 +16,7 @@ from mqterm.jobs import (
     PutFileJob,
     RebootJob,
     RunPyJob,
+    SequentialJob,
     WhoAmIJob,
 )
 
@@ -36,6 +38,15 @@ class TestJob(TestCase):
         self.assertEqual(job.args, ["1 + 2"])
         self.assertIsInstance(job, RunPyJob)
 
+    def test_from_cmd_eval_quotes(self):
+        """Job should only remove a matching pair of quotes around eval code"""
+        job = Job.from_cmd("eval \"'a' + 'b'\"")
+        self.assertEqual(job.args, ["'a' + 'b'"])
+        job = Job.from_cmd("eval len('abc')")
+        self.assertEqual(job.args, ["len('abc')"])
+        job = Job.from_cmd("eval 'a' + 'b'")
+        self.assertEqual(job.args, ["'a' + 'b'"])
+
     def test_from_cmd_no_args(self):
         """Job should handle commands with no arguments"""
         job = Job.from_cmd("uname")
@@ -49,6 +60,28 @@ class TestJob(TestCase):
         self.assertEqual(str(job), "Job for localhost: cat file.txt")
 
 
+class TestSequentialJob(TestCase):
+    def test_update(self):
+        """SequentialJob should accept messages in order until end of sequence"""
+        job = SequentialJob("x")
+        asyncio.run(job.update(b"", seq=1))
+        asyncio.run(job.update(b"", seq=2))
+        self.assertFalse(job.ready)
+        asyncio.run(job.update(b"", seq=-1))
+        self.assertTrue(job.ready)
+
+    def test_update_out_of_order(self):
+        """SequentialJob should reject duplicate, missing, and invalid messages"""
+        job = SequentialJob("x")
+        asyncio.run(job.update(b"", seq=1))
+        with self.assertRaises(RuntimeError):
+            asyncio.run(job.update(b"", seq=1))
+        with self.assertRaises(ValueError):
+            asyncio.run(job.update(b"", seq=3))
+        with self.assertRaises(ValueError):
+            asyncio.run(job.update(b"", seq=-2))
+
+
 class TestGetFileJob(TestCase):
     def setUp(self):
         # Mock the file reading for the test
@@ -118,6 +151,19 @@ class TestListDirJob(TestCase):
         expected_files = "file1.txt\nfile2.txt"
         self.assertEqual(output, expected_files)
 
+    def test_readinto(self):
+        """ListDirJob output should split names across reads into small buffers"""
+        output = Job.from_cmd(f"ls {self.test_dir}").output()
+        buf = bytearray(4)
+        chunks = []
+        while True:
+            size = output.readinto(buf)
+            if not size:
+                break
+            chunks.append(bytes(buf[:size]))
+        self.assertEqual(b"".join(chunks), b"file1.txt\nfile2.txt")
+        self.assertEqual(chunks[0], b"file")
+
 
 class TestPutFileJob(TestCase):
     def setUp(self):
@@ -143,39 +189,118 @@ class TestPutFileJob(TestCase):
         with open(self.test_file, "rb") as f:
             self.assertEqual(f.read(), self.test_contents)
 
+    def test_buffered_writes(self):
+        """Should only write to file once a block has accumulated"""
+        job = PutFileJob("cp", [self.test_file])
+        half_block = b"\xcc" * (PutFileJob.BLOCK_SIZE // 2)
+        asyncio.run(job.update(half_block, seq=1))
+        asyncio.run(job.update(half_block, seq=2))
+        self.assertEqual(job.bytes_written, 0)  # Nothing written yet
+
+        # Next payload doesn't fit, so the full block is written first
+        asyncio.run(job.update(b"\xdd", seq=3))
+        self.assertEqual(job.bytes_written, PutFileJob.BLOCK_SIZE)
+        self.assertEqual(job.buf_len, 1)
+        asyncio.run(job.update(b"", seq=-1))
+        self.assertEqual(job.bytes_written, PutFileJob.BLOCK_SIZE + 1)
+        with open(self.test_file, "rb") as f:
+            self.assertEqual(f.read(), half_block * 2 + b"\xdd")
+
 
 class TestFirmwareUpdateJob(TestCase):
+    CHECKSUM = "00" * 32  # Well-formed, for tests that don't finish the update
+
+    # Firmware data shared between tests; built once rather than in each test
+    DATA = b"\xde\xad\xbe\xef"
+    DATA_CHECKSUM = hexlify(sha256(DATA).digest()).decode("utf-8")
+    FULL_BLOCK = b"\xcc" * FirmwareUpdateJob.BLOCK_SIZE
+    HALF_BLOCK = FULL_BLOCK[: FirmwareUpdateJob.BLOCK_SIZE // 2]
+
+    def test_init(self):
+        """Should reject a checksum that isn't a hex SHA256 digest"""
+        with self.assertRaises(ValueError):
+            FirmwareUpdateJob("ota", ["firmware.bin"])
+        with self.assertRaises(ValueError):
+            FirmwareUpdateJob("ota", ["abcd"])
+
     def test_update_sha(self):
-        """Should update the SHA256 hash with each update"""
-        job = FirmwareUpdateJob("ota", ["firmware.bin"])
-        asyncio.run(job.update(b"\xde\xad\xbe\xef", seq=1))
-        expected_sha = sha256(b"\xde\xad\xbe\xef").digest()
-        self.assertEqual(job.sha.digest(), expected_sha)
+        """Should hash the data in each block written"""
+        job = FirmwareUpdateJob("ota", [self.DATA_CHECKSUM])
+
+        # Final update validates the hash of the written data against checksum
+        asyncio.run(job.update(self.DATA, seq=1))
+        asyncio.run(job.update(b"", seq=-1))
+        self.assertEqual(job.current_block, 1)
+
+    def test_update_sha_chunking(self):
+        """Should hash the same firmware identically however it is chunked"""
+        firmware = bytes(range(256)) * (FirmwareUpdateJob.BLOCK_SIZE * 5 // 512)
+        checksum = hexlify(sha256(firmware).digest()).decode("utf-8")
+
+        # Unaligned, block-aligned, and multi-block chunks
+        for chunk_size in (1000, FirmwareUpdateJob.BLOCK_SIZE, len(firmware)):
+            job = FirmwareUpdateJob("ota", [checksum])
+            seq = 1
+            for i in range(0, len(firmware), chunk_size):
+                asyncio.run(job.update(firmware[i : i + chunk_size], seq=seq))
+                seq += 1
+            asyncio.run(job.update(b"", seq=-1))  # raises on mismatch
+            self.assertEqual(job.partition.contents[: len(firmware)], firmware)
+
+    def test_checksum_mismatch(self):
+        """Should raise on final update if the hash doesn't match the checksum"""
+        checksum = hexlify(sha256(b"other data").digest()).decode("utf-8")
+        job = FirmwareUpdateJob("ota", [checksum])
+        asyncio.run(job.update(self.DATA, seq=1))
+        with self.assertRaises(ValueError):
+            asyncio.run(job.update(b"", seq=-1))
 
     def test_write_block(self):
         """Should write a block to partition when buffer is full"""
-        job = FirmwareUpdateJob("ota", ["firmware.bin"])
+        job = FirmwareUpdateJob("ota", [self.CHECKSUM])
 
         # Buffer is partially full; next update would overflow it
-        initial_data = b"\xde\xad\xbe\xef"
-        job.buffer[0 : len(initial_data)] = initial_data
-        job.buf_len = len(initial_data)
-        payload = bytearray(b"\xcc" * FirmwareUpdateJob.BLOCK_SIZE)
+        job.buffer[0 : len(self.DATA)] = self.DATA
+        job.buf_len = len(self.DATA)
+        payload = self.FULL_BLOCK
         asyncio.run(job.update(payload, seq=1))
 
         # After update, we've written exactly one full block
         self.assertEqual(job.current_block, 1)
         self.assertEqual(len(job.partition.contents), FirmwareUpdateJob.BLOCK_SIZE)
 
+    def test_write_multiple_blocks(self):
+        """Should write every full block when a payload spans several blocks"""
+        job = FirmwareUpdateJob("ota", [self.CHECKSUM])
+        payload = self.FULL_BLOCK * 2 + self.HALF_BLOCK
+        asyncio.run(job.update(payload, seq=1))
+
+        # After update, two full blocks are written and half a block is buffered
+        self.assertEqual(job.current_block, 2)
+        self.assertEqual(len(job.partition.contents), FirmwareUpdateJob.BLOCK_SIZE * 2)
+        self.assertEqual(job.buf_len, FirmwareUpdateJob.BLOCK_SIZE // 2)
+        self.assertEqual(job.bytes_written, len(payload))
+
+    def test_write_block_direct(self):
+        """Should write a full block straight from the payload if buffer is empty"""
+        job = FirmwareUpdateJob("ota", [self.CHECKSUM])
+        payload = self.FULL_BLOCK
+        asyncio.run(job.update(payload, seq=1))
+
+        # Block is written without passing through the buffer
+        self.assertEqual(job.current_block, 1)
+        self.assertEqual(job.partition.contents, payload)
+        self.assertEqual(job.buf_len, 0)
+        self.assertEqual(job.buffer, bytearray(FirmwareUpdateJob.BLOCK_SIZE))
+
     def test_wait_partial_block(self):
         """Should not write a block until buffer is full"""
-        job = FirmwareUpdateJob("ota", ["firmware.bin"])
+        job = FirmwareUpdateJob("ota", [self.CHECKSUM])
 
         # Buffer is partially full but next update would not overflow it
-        initial_data = b"\xde\xad\xbe\xef"
-        job.buffer[0 : len(initial_data)] = initial_data
-        job.buf_len = len(initial_data)
-        payload = bytearray(b"\xcc" * (FirmwareUpdateJob.BLOCK_SIZE // 2))
+        job.buffer[0 : len(self.DATA)] = self.DATA
+        job.buf_len = len(self.DATA)
+        payload = self.HALF_BLOCK
         asyncio.run(job.update(payload, seq=1))
 
         # After update, nothing written yet
@@ -184,38 +309,32 @@ class TestFirmwareUpdateJob(TestCase):
 
     def test_last_block_fill(self):
         """Should fill space in last block with empty data on final update"""
-        initial_data = b"\xde\xad\xbe\xef"
-        checksum = hexlify(sha256(initial_data).digest()).decode("utf-8")
-        job = FirmwareUpdateJob("ota", [checksum])
+        job = FirmwareUpdateJob("ota", [self.DATA_CHECKSUM])
 
         # Send and complete the update
-        asyncio.run(job.update(initial_data, seq=1))
+        asyncio.run(job.update(self.DATA, seq=1))
         asyncio.run(job.update(b"", seq=-1))
 
         # After final update, we should have written one last block of full size
         self.assertEqual(job.current_block, 1)
         self.assertEqual(len(job.partition.contents), FirmwareUpdateJob.BLOCK_SIZE)
         self.assertEqual(
-            job.partition.contents[: len(initial_data)],
-            initial_data,
+            job.partition.contents[: len(self.DATA)],
+            self.DATA,
             "Last block should contain the initial data",
         )
         self.assertEqual(
-            job.partition.contents[len(initial_data) :],
-            bytearray(
-                0xFF for _ in range(FirmwareUpdateJob.BLOCK_SIZE - len(initial_data))
-            ),
+            job.partition.contents[len(self.DATA) :],
+            b"\xff" * (FirmwareUpdateJob.BLOCK_SIZE - len(self.DATA)),
             "Remaining bytes in last block should be filled with empty data",
         )
 
     def test_output(self):
         """Should return the total bytes written as output"""
-        initial_data = b"\xde\xad\xbe\xef"
-        checksum = hexlify(sha256(initial_data).digest()).decode("utf-8")
-        job = FirmwareUpdateJob("ota", [checksum])
+        job = FirmwareUpdateJob("ota", [self.DATA_CHECKSUM])
 
         # Send and complete the update
-        asyncio.run(job.update(initial_data, seq=1))
+        asyncio.run(job.update(self.DATA, seq=1))
         asyncio.run(job.update(b"", seq=-1))
 
         # Output should be the total bytes written
@@ -248,6 +367,10 @@ class TestRebootJob(TestCase):
 
 
 class TestRunPyJob(TestCase):
+    def setUp(self):
+        # Compiled code is cached across jobs; start each test without any
+        jobs._code_cache.clear()
+
     def test_eval(self):
         """RunPyJob should evaluate a Python expression and return result"""
         job = RunPyJob("eval", ["1 + 2"])
@@ -260,6 +383,31 @@ class TestRunPyJob(TestCase):
         output = job.output().read().decode("utf-8").strip()
         self.assertEqual(output, "3")
 
+    def test_compile_cache(self):
+        """RunPyJob should reuse compiled code for repeated expressions"""
+        job = RunPyJob("eval", ["x * 2"], globals={"x": 1})
+        self.assertEqual(job.output().read(), b"2")
+        mode, op = jobs._code_cache["x * 2"]
+        self.assertEqual(mode, "eval")
+
+        # Same expression with different globals reuses code but not results
+        job = RunPyJob("eval", ["x * 2"], globals={"x": 2})
+        self.assertEqual(job.output().read(), b"4")
+        self.assertIs(jobs._code_cache["x * 2"][1], op)
+
+    def test_compile_cache_exec(self):
+        """RunPyJob should remember that a script isn't an expression"""
+        job = RunPyJob("exec", ["x = 1"])
+        job.output()
+        self.assertEqual(jobs._code_cache["x = 1"][0], "exec")
+
+    def test_compile_cache_long(self):
+        """RunPyJob should not cache long scripts"""
+        expr = "x = 1\n" * RunPyJob.CACHE_MAX_LEN
+        job = RunPyJob("exec", [expr])
+        job.output()
+        self.assertNotIn(expr, jobs._code_cache)
+
     def test_exec(self):
         """RunPyJob should execute a Python script with side effects"""
         cmd = """
@@ -272,3 +420,20 @@ class TestRunPyJob(TestCase):
         self.assertEqual(job_output, "")  # No output expected
         self.assertEqual(file_output, "Hello, World!")
         os.remove("output.txt")
+
+    def test_exec_output(self):
+        """RunPyJob should return output printed by a script"""
+        try:
+            from contextlib import redirect_stdout  # noqa: F401
+        except ImportError:
+            self.skipTest("stdout can't be redirected on this platform")
+
+        # Capture by redirecting stdout, as on platforms without dupterm
+        old_dupterm = jobs.dupterm
+        jobs.dupterm = None
+        try:
+            job = RunPyJob("exec", ["for i in range(2): print(i)"])
+            output = job.output().read().decode("utf-8").strip()
+        finally:
+            jobs.dupterm = old_dupterm
+        self.assertEqual(output, "0\n1")
@@ -0,0 +1,42 @@
+import asyncio
+from unittest import TestCase
+
+from tests.utils import AsyncMock, Mock, assert_call_counts, call
+
+
+class TestMock(TestCase):
+    def test_assert_has_calls_not_strict(self):
+        """Mock should find consecutive expected calls anywhere if not strict"""
+        mock = Mock()
+        mock(1)
+        mock(2)
+        mock(3)
+        mock.assert_has_calls([call(2), call(3)], strict=False)
+        with self.assertRaises(AssertionError):  # not consecutive
+            mock.assert_has_calls([call(1), call(3)], strict=False)
+        with self.assertRaises(AssertionError):  # strict needs every call
+            mock.assert_has_calls([call(2), call(3)])
+
+    def test_assert_call_count(self):
+        """Mock should check the exact number of calls"""
+        mock = Mock()
+        mock.assert_call_count(0)
+        mock()
+        mock.assert_called_once()
+        mock()
+        mock.assert_call_count(2)
+        with self.assertRaises(AssertionError):
+            mock.assert_called_once()
+
+    def test_assert_call_counts(self):
+        """assert_call_counts should check several mocks and report all mismatches"""
+        first, second = Mock(), AsyncMock()
+        first()
+        asyncio.run(second())
+        asyncio.run(second())
+        second.assert_await_count(2)
+        assert_call_counts(first=(first, 1), second=(second, 2))
+        with self.assertRaises(AssertionError) as ctx:
+            assert_call_counts(first=(first, 2), second=(second, 1))
+        self.assertIn("first", str(ctx.exception))
+        self.assertIn("second", str(ctx.exception))
@@ -2,6 +2,18 @@ def call(*args, **kwargs):
     return (tuple(args), dict(kwargs))
 
 
+def assert_call_counts(**mocks):
+    """Assert call counts for several mocks, given as name=(mock, count)."""
+    # Collect every mismatch so one failure reports all of them
+    errors = []
+    for name in sorted(mocks):
+        mock, count = mocks[name]
+        if mock.call_count != count:
+            errors.append(f"{name}: expected {count} calls, got {mock.call_count}")
+    if errors:
+        raise AssertionError("; ".join(errors))
+
+
 class Mock:
     """A mock callable object that stores its calls."""
 
@@ -9,50 +21,87 @@ class Mock:
         self.return_value = return_value
         self.side_effect = side_effect
         self._calls = []
+        self.call_count = 0
 
     def __call__(self, *args, **kwargs):
         """Call the mock and store the call details."""
-        self._calls.append(call(*args[1:], **kwargs))  # Skip the first argument (self)
+        self.call_count += 1
+        # args and kwargs are already a fresh tuple and dict; store them as-is
+        self._calls.append((args, kwargs))
+        # Exceptions are raised; other side effects are called with the arguments
         if self.side_effect:
-            raise self.side_effect
+            if isinstance(self.side_effect, (type, BaseException)):
+                raise self.side_effect
+            return self.side_effect(*args, **kwargs)
         return self.return_value
 
     def assert_called(self):
         """Assert that the mock was called at least once."""
-        assert len(self._calls) > 0, "Expected mock to be called, but it was not."
+        if not self.call_count:
+            raise AssertionError("Expected mock to be called, but it was not.")
 
     def assert_not_called(self):
         """Assert that the mock was not called."""
-        assert len(self._calls) == 0, "Expected mock to not be called, but it was."
+        if self.call_count:
+            raise AssertionError("Expected mock to not be called, but it was.")
+
+    def assert_call_count(self, count):
+        """Assert that the mock was called exactly the given number of times."""
+        if self.call_count != count:
+            raise AssertionError(f"Expected {count} calls, got {self.call_count}")
+
+    def assert_called_once(self):
+        """Assert that the mock was called exactly once."""
+        self.assert_call_count(1)
+
+    def assert_called_once_with(self, *args, **kwargs):
+        """Assert that the mock was called exactly once with the given arguments."""
+        self.assert_called_once()
+        self.assert_called_with(*args, **kwargs)
 
     def assert_called_with(self, *args, **kwargs):
         """Assert that the mock was last called with the given arguments."""
         # Fail if no calls were made
-        self.assert_called()
+        if not self.call_count:
+            raise AssertionError("Expected mock to be called, but it was not.")
 
-        # Try to have a useful output for assertion failures
-        expectation = call(*args, **kwargs)
-        assert self._calls[-1] == expectation, "Expected call with {}, got {}".format(
-            expectation, self._calls[-1]
-        )
+        # Compare against the raw record; only format a message on failure
+        last = self._calls[-1]
+        if last != (args, kwargs):
+            raise AssertionError(f"Expected call with {(args, kwargs)}, got {last}")
 
-    def assert_has_calls(self, calls):
+    def assert_has_calls(self, calls, strict=True):
         """Assert that the mock has the expected calls with arguments."""
-        assert calls, "Expected calls cannot be empty."
+        if not calls:
+            raise AssertionError("Expected calls cannot be empty.")
 
         # Fail if no calls were made
-        self.assert_called()
-
-        assert self._calls == calls, "Expected calls {}, got {}".format(
-            calls, self._calls
-        )
+        if not self.call_count:
+            raise AssertionError("Expected mock to be called, but it was not.")
+
+        # If not strict, the calls only need to appear consecutively somewhere in
+        # the call history, like unittest.mock's assert_has_calls
+        if not strict:
+            calls = list(calls)
+            count = len(calls)
+            for start in range(len(self._calls) - count + 1):
+                if self._calls[start : start + count] == calls:
+                    return
+            raise AssertionError(f"Expected calls {calls} in {self._calls}")
+
+        # Report the first call that differs rather than both lists of calls
+        for i, (actual, expected) in enumerate(zip(self._calls, calls)):
+            if actual != expected:
+                raise AssertionError(f"Call {i}: expected {expected}, got {actual}")
+        if len(self._calls) != len(calls):
+            raise AssertionError(f"Expected {len(calls)} calls, got {len(self._calls)}")
 
 
 class AsyncMock(Mock):
     """An async version of Mock that can be awaited."""
 
     async def __call__(self, *args, **kwargs):
-        return super().__call__(self, *args, **kwargs)
+        return super().__call__(*args, **kwargs)
 
     def assert_awaited(self):
         """Assert that the async mock was awaited at least once."""
@@ -62,10 +111,22 @@ class AsyncMock(Mock):
         """Assert that the async mock was not awaited."""
         return super().assert_not_called()
 
+    def assert_awaited_once(self):
+        """Assert that the async mock was awaited exactly once."""
+        return super().assert_called_once()
+
+    def assert_awaited_once_with(self, *args, **kwargs):
+        """Assert that the async mock was awaited once with the given arguments."""
+        return super().assert_called_once_with(*args, **kwargs)
+
+    def assert_await_count(self, count):
+        """Assert that the async mock was awaited exactly the given number of times."""
+        return super().assert_call_count(count)
+
     def assert_awaited_with(self, *args, **kwargs):
         """Assert that the async mock was last awaited with the given arguments."""
         return super().assert_called_with(*args, **kwargs)
 
-    def assert_has_awaits(self, awaits):
+    def assert_has_awaits(self, awaits, strict=True):
         """Assert that the async mock has the expected awaits with arguments."""
-        return super().assert_has_calls(awaits)
+        return super().assert_has_calls(awaits, strict=strict)